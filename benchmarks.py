@@ -0,0 +1,87 @@
+import gc
+import tracemalloc
+from time import perf_counter
+from units import Group, InputGroup, OutputGroup, connect
+from sparse import SparseNetwork
+
+def timed(function, *args):
+    start = perf_counter()
+    function(*args)
+    return perf_counter() - start
+
+def allocated(function, *args):
+    """Bytes still held once function returns, along with its result"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = function(*args)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+def build_layers(sizes, precision=None):
+    layers = [InputGroup(sizes[0], [], precision=precision)]
+    layers.extend(Group(size, precision=precision) for size in sizes[1:-1])
+    layers.append(OutputGroup(sizes[-1], precision=precision))
+    for source, target in zip(layers, layers[1:]):
+        connect(source, target)
+    return layers
+
+def unroll(layers, steps):
+    for step in range(steps):
+        layers[0].update([step % 2] * len(layers[0].units))
+        for layer in layers:
+            layer.go()
+
+def backprop(layers, steps, targets):
+    for step in range(steps):
+        layers[-1].cost(targets, False)
+        for layer in reversed(layers[:-1]):
+            layer.backprop(False)
+
+def precision_benchmark(sizes=(64, 256, 256, 16), steps=200):
+    """Memory held by the per-step history and by the CSR engine's weight array, and step throughput,
+    for each storage precision. Connection objects are the same at every precision, so their
+    footprint is printed once; only the array-backed paths shrink."""
+    weight_bytes, _ = allocated(build_layers, sizes)
+    print("Connection objects: {:.0f} KiB".format(weight_bytes / 1024))
+    print("precision  history KiB  engine weights KiB  forward steps/s  backprop steps/s")
+    for precision in (None, 'float64', 'float32'):
+        layers = build_layers(sizes, precision)
+        history_bytes, _ = allocated(unroll, layers, steps)
+        forward = steps / timed(unroll, layers, steps)
+        targets = [0.5] * sizes[-1]
+        #both unrolls above left their history, so there are twice as many steps to backprop
+        back = 2 * steps / timed(backprop, layers, 2 * steps, targets)
+        network = SparseNetwork(layers, precision or 'float64')
+        engine_bytes = network.weights.itemsize * len(network.weights)
+        print("{:9}  {:11.0f}  {:18.0f}  {:15.1f}  {:16.1f}".format(
+            str(precision), history_bytes / 1024, engine_bytes / 1024, forward, back))
+
+def build_sparse(sizes, density):
+    layers = [InputGroup(sizes[0], [])]
+    layers.extend(Group(size) for size in sizes[1:-1])
+    layers.append(OutputGroup(sizes[-1]))
+    for number, source in enumerate(layers):
+        for target in layers[number + 1:]:
+            connect(source, target, 'sparse', density=density)
+        connect(source, source, 'sparse', density=density)
+    return layers
+
+def sparse_benchmark(sizes=(200, 400, 400, 400, 100), density=0.01, steps=50):
+    """Step throughput of the object path against the CSR engine on an irregular graph with skips and loops"""
+    layers = build_sparse(sizes, density)
+    network = SparseNetwork(layers)
+    values = [1.0] * sizes[0]
+    targets = [0.5] * sizes[-1]
+    print("engine   forward steps/s  backprop steps/s")
+    forward = steps / timed(unroll, layers, steps)
+    back = steps / timed(backprop, layers, steps, targets)
+    print("objects  {:15.1f}  {:16.1f}".format(forward, back))
+    forward = steps / timed(lambda: [network.go(values) for _ in range(steps)])
+    back = steps / timed(lambda: [network.backprop(targets, False) for _ in range(steps)])
+    print("sparse   {:15.1f}  {:16.1f}".format(forward, back))
+
+if __name__ == "__main__":
+    precision_benchmark()
+    sparse_benchmark()
@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from units import Connection, Unit
+from dropout import require_eval
+
+def group_forward(groups):
+    """A forward function for ForwardCache: one step through the Unit objects from a reset state, leaving them reset.
+    A dropout draw is no answer to cache, so it raises while any unit would drop out."""
+    def forward(values):
+        require_eval([unit for group in groups for unit in group.units], 'group_forward')
+        for group in groups:
+            group.reset()
+        groups[0].update(values)
+        for group in groups:
+            group.go()
+        outputs = [unit.output for unit in groups[-1].units]
+        for group in groups:
+            group.reset()
+        return outputs
+    return forward
+
+class ForwardCache:
+    """
+    Opt-in LRU memoisation of a forward function taking one input vector and returning the
+    outputs, such as group_forward(groups) or lambda values: network.infer([values])[0].
+
+    Results are keyed on the input vector itself, so repeated inputs cost a dictionary lookup.
+    At most maxsize results are kept, dropping the least recently used first. Any change to a
+    Connection.value clears the cache - only changes to the given groups' connections if groups
+    is passed - so committed updates never serve stale outputs. Adding or removing an edge
+    anywhere (Unit.rewired) clears it too, and the groups' connections are gathered again.
+    Call close() to stop watching.
+    """
+    def __init__(self, forward, maxsize=1024, groups=None):
+        self.forward = forward
+        self.maxsize = maxsize
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.groups = groups
+        self.watched = None
+        self.rewire()
+        Connection.observers.append(self.weight_changed)
+
+    def rewire(self):
+        """Gather the watched connections afresh after the graph changed, dropping every result"""
+        self.wiring = Unit.rewired
+        if self.groups is not None:
+            self.watched = {id(weight) for group in self.groups for unit in group.units for weight in unit.weights}
+        if self.results:
+            self.clear()
+            self.invalidations += 1
+
+    def __call__(self, values):
+        if self.wiring != Unit.rewired:
+            self.rewire()
+        key = tuple(values)
+        results = self.results
+        if key in results:
+            results.move_to_end(key)
+            self.hits += 1
+            return list(results[key])
+        self.misses += 1
+        outputs = self.forward(values)
+        results[key] = tuple(outputs)
+        if len(results) > self.maxsize:
+            results.popitem(last=False)
+        return list(outputs)
+
+    def weight_changed(self, connection, old, new):
+        if old == new or not self.results:
+            return
+        if self.wiring != Unit.rewired:
+            self.rewire() #the connection may be a new edge of the groups
+        elif self.watched is None or id(connection) in self.watched:
+            self.clear()
+            self.invalidations += 1
+
+    def clear(self):
+        self.results.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.results), 'maxsize': self.maxsize,
+                'invalidations': self.invalidations, 'hit_rate': self.hits / lookups if lookups else 0}
+
+    def close(self):
+        if self.weight_changed in Connection.observers:
+            Connection.observers.remove(self.weight_changed)
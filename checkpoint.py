@@ -0,0 +1,110 @@
+import random
+from math import isqrt
+
+#state a unit carries from one time step into the next; everything else is history or backprop state
+carried_state = ('logit', 'frozenlogit', 'frozen', 'output', '_derivative')
+
+def checkpoint_interval(steps):
+    """The segment length that minimises peak memory for an unroll of this many steps"""
+    return max(1, isqrt(steps))
+
+class CheckpointedUnroll:
+    """
+    Backprop through time for a list of groups without keeping every step's history.
+    
+    Calling go() once per time step is the same as updating the first (input) group and calling
+    go() on each group in turn, except that the hidden_state/derivative history is only kept for
+    the latest segment of `every` steps. At the start of each segment the carried state of every
+    unit is snapshotted instead; backprop() rebuilds the history of earlier segments from those
+    snapshots, one segment at a time. With every=checkpoint_interval(T) the history held per unit
+    drops from T entries to about 2*sqrt(T), for roughly one extra forward pass.
+    """
+    def __init__(self, groups, every):
+        self.groups = groups
+        self.units = [unit for group in groups for unit in group.units]
+        self.every = every
+        self.inputs = []
+        self.snapshots = []
+        #history that was already there before the unroll started is left alone
+        self.depths = [len(unit.hidden_state) for unit in self.units]
+    
+    def _snapshot(self):
+        units = [tuple(getattr(unit, name) for name in carried_state) for unit in self.units]
+        #replayed steps must drop out the same units, so the dropout masks and RNG are saved too
+        masks = []
+        for group in self.groups:
+            mask = group.__dict__.get('mask')
+            masks.append((mask, dict(mask.__dict__) if mask else None))
+        return units, masks, random.getstate()
+    def _restore(self, snapshot):
+        units, masks, random_state = snapshot
+        for unit, state in zip(self.units, units):
+            for name, value in zip(carried_state, state):
+                setattr(unit, name, value)
+        for group, (mask, mask_state) in zip(self.groups, masks):
+            if mask is None:
+                group.__dict__.pop('mask', None)
+            else:
+                group.mask = mask
+                mask.__dict__.update(mask_state)
+        random.setstate(random_state)
+    def _drop_history(self):
+        for unit, depth in zip(self.units, self.depths):
+            del unit.hidden_state[depth:]
+            del unit.derivative[depth:]
+    
+    def _step(self, values):
+        if values is not None:
+            self.groups[0].update(values)
+        for group in self.groups:
+            group.go()
+    
+    """Run one time step, feeding values to the first group if given"""
+    def go(self, values=None):
+        step = len(self.inputs)
+        if step % self.every == 0:
+            if step:
+                self._drop_history()
+            self.snapshots.append(self._snapshot())
+        self.inputs.append(values)
+        self._step(values)
+    
+    def _backprop_step(self, targets, commit):
+        cost_val = 0
+        for group in reversed(self.groups):
+            if targets is not None and hasattr(group, 'cost'):
+                cost_val += group.cost(targets, commit)
+            else:
+                group.backprop(commit)
+        return cost_val
+    
+    """Backprop through every step since the last backprop, newest first.
+    targets holds one entry per step for the output group, or None for steps without a cost.
+    Gradients are accumulated over the whole unroll and, if commit, committed once at the end,
+    so recomputed segments always see the weights the forward pass used.
+    Returns the summed cost."""
+    def backprop(self, targets=None, commit=True):
+        steps = len(self.inputs)
+        if targets is None:
+            targets = [None] * steps
+        final = self._snapshot()
+        cost_val = 0
+        last = len(self.snapshots) - 1
+        for segment in range(last, -1, -1):
+            start = segment * self.every
+            stop = min(start + self.every, steps)
+            if segment != last:
+                #rebuild this segment's history from its snapshot
+                self._restore(self.snapshots[segment])
+                for step in range(start, stop):
+                    self._step(self.inputs[step])
+            for step in range(stop - 1, start - 1, -1):
+                cost_val += self._backprop_step(targets[step], False)
+        self._restore(final)
+        if commit:
+            for unit in self.units:
+                for weight in unit.weights:
+                    weight.commit()
+        self.inputs = []
+        self.snapshots = []
+        return cost_val
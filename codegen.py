@@ -0,0 +1,162 @@
+from math import exp, tanh
+import nonlinearities as nl
+from units import Connection, OutputGroup
+from dropout import require_eval
+
+#expressions that stand in for the stock nonlinearities, so generated code needs no call for them
+inline = {
+    nl.sigmoid: '1/(1+exp(-{0}))',
+    nl.dsigmoid: '{0}*(1-{0})',
+    nl.tanh: 'tanh({0})',
+    nl.dtanh: '1 - {0}**2',
+    nl.linear: '{0}',
+    nl.dlinear: '1',
+    nl.rectified_linear: 'max(0, {0})',
+    nl.drectified_linear: 'int({0} != 0)'
+    }
+
+class CompiledNetwork:
+    """
+    A list of groups compiled into straight-line python for fast repeated runs of small fixed graphs.
+
+    The generated forward step replays exactly what updating the first group and calling go() on
+    each group does - the same sends in the same order, frozen units collecting into their
+    frozenlogit - but in local variables, with each weight read as w[index] and the stock
+    nonlinearities written out inline. The backward step likewise replays OutputGroup.cost() and
+    Group.backprop() over the groups in reverse. Results are identical to the Unit objects, not
+    just close. The unit objects themselves are left untouched; gradients are collected in
+    self.gradients and handed to each Connection's update() on commit.
+
+    Dropout is not compiled in, so go() raises while any unit with dropout is in training mode.
+    The graph is frozen at compile time: rebuild after adding or removing units or connections,
+    and call sync() after changing weight values from outside.
+    """
+    def __init__(self, groups):
+        self.groups = groups
+        self.units = [unit for group in groups for unit in group.units]
+        self.dropout_units = [unit for unit in self.units if unit.dropout]
+        index = {id(unit): number for number, unit in enumerate(self.units)}
+        self.connections = []
+        self.edges = [] #per unit, its (target index, weight index) pairs in send order
+        for unit in self.units:
+            edges = []
+            for output, weight in zip(unit.outputs, unit.weights):
+                if id(output) in index:
+                    edges.append((index[id(output)], len(self.connections)))
+                    self.connections.append(weight)
+            self.edges.append(edges)
+        self.namespace = {'exp': exp, 'tanh': tanh}
+        self.source = "\n".join(self._forward_source() + self._backward_source(True) + self._backward_source(False))
+        exec(compile(self.source, '<compiled network>', 'exec'), self.namespace)
+        self.inputs = [index[id(unit)] for unit in groups[0].units]
+        self.outputs = [index[id(unit)] for unit in groups[-1].units]
+        self.gradients = [weight.delta_accumulator for weight in self.connections]
+        self.sync()
+        self.reset()
+
+    def _call(self, function, argument):
+        if function in inline:
+            return inline[function].format(argument)
+        name = 'f{}'.format(id(function))
+        self.namespace[name] = function
+        return '{}({})'.format(name, argument)
+
+    def _forward_source(self):
+        count = len(self.units)
+        names = lambda prefix: ", ".join('{}{}'.format(prefix, i) for i in range(count)) + ","
+        lines = ["def forward(w, logits):", "    {} = logits".format(names('l'))]
+        start = 0
+        for group in self.groups:
+            members = range(start, start + len(group.units))
+            start += len(group.units)
+            for i in members:
+                lines.append("    fl{} = 0".format(i))
+            for i in members:
+                unit = self.units[i]
+                lines.append("    o{0} = {1}".format(i, self._call(unit.nonlinearity, 'l{}'.format(i))))
+                lines.append("    d{0} = {1}".format(i, self._call(unit.nonlinearity_deriv, 'o{}'.format(i))))
+                lines.append("    l{} = 0".format(i))
+                for target, weight in self.edges[i]:
+                    #units in the running group are frozen, so they collect into their frozenlogit
+                    prefix = 'fl' if target in members else 'l'
+                    lines.append("    {0}{1} = {0}{1} + w[{2}] * o{3}".format(prefix, target, weight, i))
+            for i in members:
+                lines.append("    l{0} = fl{0}".format(i))
+        lines.append("    return ({}), ({}), ({})".format(names('l'), names('o'), names('d')))
+        return lines
+
+    def _backward_source(self, with_targets):
+        count = len(self.units)
+        names = ", ".join('d{}'.format(i) for i in range(count)) + ","
+        limit = Connection.max_magnitude
+        name = 'backward_cost' if with_targets else 'backward'
+        lines = ["def {}(w, g, outputs, derivatives, deltas, targets):".format(name),
+                 "    {} = deltas".format(names),
+                 "    cost_val = 0"]
+        stop = count
+        for group in reversed(self.groups):
+            members = range(stop - len(group.units), stop)
+            stop -= len(group.units)
+            costed = with_targets and isinstance(group, OutputGroup)
+            if costed:
+                lines.append("    group_cost = 0")
+            for position, i in enumerate(members):
+                unit = self.units[i]
+                lines.append("    s = outputs[{}]".format(i))
+                lines.append("    delta = 0")
+                for target, weight in self.edges[i]:
+                    lines.append("    delta = delta + w[{}] * d{}".format(weight, target))
+                    lines.append("    g[{0}] = min({1!r}, max({2!r}, g[{0}] + d{3} * s))".format(weight, limit, -limit, target))
+                if costed:
+                    lines.append("    group_cost = group_cost + {}".format(self._call(unit.cost_function, 's, targets[{}]'.format(position))))
+                    lines.append("    delta = {}".format(self._call(unit.cost_derivative, 's, targets[{}]'.format(position))))
+                #held back until the whole group is done, as Group.backprop_units does
+                lines.append("    n{0} = delta * derivatives[{0}]".format(i))
+            for i in members:
+                lines.append("    d{0} = n{0}".format(i))
+            if costed:
+                lines.append("    cost_val = cost_val + group_cost / {}".format(len(group.units)))
+        lines.append("    return cost_val, ({})".format(names))
+        return lines
+
+    def sync(self):
+        """Reload weights from the Connections after they were changed outside the compiled code"""
+        self.weights = [weight.value for weight in self.connections]
+
+    def reset(self):
+        self.logits = (0,) * len(self.units)
+        self.deltas = (0,) * len(self.units)
+        self.hidden_state = []
+        self.derivative = []
+
+    """Run one time step, feeding values to the first group if given. Returns the last group's outputs."""
+    def go(self, values=None):
+        require_eval(self.dropout_units, 'CompiledNetwork')
+        if values is not None:
+            logits = list(self.logits)
+            for row, value in zip(self.inputs, values):
+                logits[row] = value
+            self.logits = logits
+        self.logits, outputs, derivatives = self.namespace['forward'](self.weights, self.logits)
+        self.hidden_state.append(outputs)
+        self.derivative.append(derivatives)
+        return [outputs[row] for row in self.outputs]
+
+    """Backprop the latest step, as OutputGroup.cost(targets) then backprop() on the other groups
+    would. Without targets every group just backprops. Returns the cost."""
+    def backprop(self, targets=None, commit=True):
+        outputs = self.hidden_state.pop()
+        derivatives = self.derivative.pop()
+        backward = self.namespace['backward' if targets is None else 'backward_cost']
+        cost_val, self.deltas = backward(self.weights, self.gradients, outputs, derivatives, self.deltas, targets)
+        if commit:
+            self.commit()
+        return cost_val
+
+    def commit(self):
+        """Hand the collected gradients to each Connection's own update rule"""
+        for number, weight in enumerate(self.connections):
+            weight.delta_accumulator = self.gradients[number]
+            weight.update(0)
+            self.gradients[number] = 0
+        self.sync()
@@ -0,0 +1,49 @@
+from random import getrandbits
+
+def require_eval(units, engine):
+    """Raise for engines that don't apply dropout if any of units would drop out, rather than
+    let them train as if it were off"""
+    for unit in units:
+        if unit.dropout and unit.training:
+            raise ValueError("{} can't run units with dropout in training mode: call eval() on the groups, or train with the Group objects".format(engine))
+
+#dropout masks are drawn for many steps at once and kept bit-packed: one bit per unit per step, set when the unit is kept
+
+def bernoulli_bits(p, count, resolution=16):
+    """count random bits packed little-endian into bytes, each set with probability p
+    (rounded to a multiple of 2**-resolution), using resolution big getrandbits calls in total"""
+    level = round(p * (1 << resolution))
+    if level >= 1 << resolution:
+        return bytes([0xff]) * ((count + 7) // 8)
+    bits = 0
+    #fold in one random word per binary digit of p, least significant first: OR for a 1, AND for a 0
+    for digit in range(resolution):
+        if level >> digit & 1:
+            bits |= getrandbits(count)
+        else:
+            bits &= getrandbits(count)
+    return bits.to_bytes((count + 7) // 8, 'little')
+
+class DropoutMask:
+    """Keep/drop decisions for a fixed list of dropout rates, refilled `steps` steps at a time.
+    Units sharing a rate share one packed array, so a refill costs a few calls per distinct rate."""
+    def __init__(self, rates, steps=64):
+        self.rates = tuple(rates)
+        self.steps = steps
+        self.sizes = {} #how many units share each rate
+        self.lookup = [] #per unit, its rate and its place among the units sharing it
+        for rate in self.rates:
+            self.lookup.append((rate, self.sizes.get(rate, 0)))
+            self.sizes[rate] = self.sizes.get(rate, 0) + 1
+        self.step = steps
+    def refill(self):
+        self.bits = {rate: bernoulli_bits(1 - rate, self.steps * size) for rate, size in self.sizes.items()}
+        self.step = 0
+    def advance(self):
+        self.step += 1
+        if self.step >= self.steps:
+            self.refill()
+    def keep(self, position):
+        rate, index = self.lookup[position]
+        bit = self.step * self.sizes[rate] + index
+        return bool(self.bits[rate][bit >> 3] >> (bit & 7) & 1)
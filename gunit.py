@@ -1,4 +1,5 @@
 from tkinter import *
+from contextlib import contextmanager
 from units import Unit, InputUnit, OutputUnit
 from units import Connection
 import weakref
@@ -44,12 +45,22 @@ def value_to_color(val, minval=-MAXVAL, maxval=MAXVAL):
 tocolor = value_to_color
 
 class MessageDisplay:
+    quiet = 0
     @classmethod
     def start(cls):
         cls.message = StringVar()
     @classmethod
     def set(cls, newmessage):
-        cls.message.set(newmessage)
+        if not cls.quiet:
+            cls.message.set(newmessage)
+    @classmethod
+    @contextmanager
+    def suppressed(cls): #hold back the per-item messages while building lots of items
+        cls.quiet += 1
+        try:
+            yield
+        finally:
+            cls.quiet -= 1
 
 class Watchable:
     def __setattr__(self, name, value):
@@ -86,24 +97,30 @@ class Watchable:
         self.graphic.remove()
 
 class Graphic(Frame):
+    paused = False #while True, recoloring is skipped; bulk builds repaint once at the end instead
     def __init__(self, item, canvas):
         super().__init__(master=canvas, width=0, height=0)
         self._item = item #create a circular reference so unit objects are not deleted
         self.canvas = canvas
         self.ids = {}
+    def register(self, itemref):
+        #clicks are bound once per tag by the App, which finds the clicked object through this lookup
+        for part in self.ids:
+            self.canvas.master.items[self.ids[part]] = itemref
     def remove(self):
         for part in self.ids:
+            self.canvas.master.items.pop(self.ids[part], None)
             self.canvas.delete(self.ids[part])
         del self._item
     def recolor(self, what, value, minval=None, maxval=None):
-        self.canvas.itemconfig(self.ids[what], fill=tocolor(value, minval, maxval))
+        if not Graphic.paused:
+            self.canvas.itemconfig(self.ids[what], fill=tocolor(value, minval, maxval))
 
 class ConnectionGraphic(Graphic):
     def __init__(self, con, canvas, startpos, endpos):
         super().__init__(con, canvas)
-        self.ids = {'value': self.canvas.create_line(*startpos, *endpos, fill='black', width=5, stipple='gray25')}
-        for part in self.ids:
-            self.canvas.tag_bind(self.ids[part], "<Button-1>", self.canvas.master.configconnection(weakref.ref(con)))
+        self.ids = {'value': self.canvas.create_line(*startpos, *endpos, fill='black', width=5, stipple='gray25', tags='connection')}
+        self.register(weakref.ref(con))
 
 class GConnection(Connection, Watchable):
     def __init__(self, canvas, startunit, endunit, *args, **kwargs):
@@ -128,7 +145,7 @@ class GConnection(Connection, Watchable):
         return super().value
     @value.setter
     def value(self, newvalue):
-        self._value = newvalue
+        Connection.value.fset(self, newvalue)
         self.graphic.recolor('value', self.value)
     def highlight(self):
         for part in self.graphic.ids:
@@ -150,9 +167,7 @@ class UnitGraphic(Graphic):
         self.find_bounds(position)
         self.gen_graphic()
         self.canvas.addtag_withtag('unit', self.ids['_derivative'])
-        for piece in self.ids:
-            self.canvas.tag_bind(self.ids[piece], "<Button-1>", self.canvas.master.addconnection(self.unit))
-        self.checktags()
+        self.register(self.unit)
     def find_bounds(self, mainposition):
         mp = mainposition
         self.positions['logit'] = (*mp, mp[0]+self.smallsize, mp[1]+self.bigsize)
@@ -175,9 +190,9 @@ class UnitGraphic(Graphic):
         self.ids = {}
         for key in self.positions.keys():
             if key=='logit' and isinstance(self.unit(), InputUnit):
-                self.ids['logit'] = self.canvas.create_polygon(*self.positions['logit'], fill=tocolor(0,0,1), outline='black', width=1)
+                self.ids['logit'] = self.canvas.create_polygon(*self.positions['logit'], fill=tocolor(0,0,1), outline='black', width=1, tags='unitpart')
             else:
-                self.ids[key] = self.canvas.create_rectangle(*(self.positions[key]), fill=tocolor(0, 0, 1))
+                self.ids[key] = self.canvas.create_rectangle(*(self.positions[key]), fill=tocolor(0, 0, 1), tags='unitpart')
     @property
     def position(self):
         pos = self.canvas.bbox(self.ids['logit'])[:2]
@@ -190,7 +205,7 @@ class UnitGraphic(Graphic):
         self.find_bounds(newposition)
         for key, item in self.ids.items():
             self.canvas.coords(item, *self.positions[key])
-    def checktags(self):
+    def checktags(self): #called by App.poll_units for units the run line has tagged
         tags = self.canvas.itemcget(self.ids['_derivative'], 'tags')
         if 'forward' in tags and 'forward_done' not in tags:
             self.unit().go()
@@ -203,9 +218,8 @@ class UnitGraphic(Graphic):
             self.cleartags()
         if 'remove' in tags:
             self._u.delete()
-        self.after(20, self.checktags)
     def cleartags(self):
-        self.canvas.itemconfig(self.ids['_derivative'], tags='unit')
+        self.canvas.itemconfig(self.ids['_derivative'], tags=('unit', 'unitpart'))
 
 class GUnit(Unit, Watchable):
     def __init__(self, canvas, position, *args, **kwargs):
@@ -266,9 +280,9 @@ class GInputUnit(GUnit, InputUnit):
         logit = self.logit
         super().reset()
         self.logit = logit
-    def forward(self):
+    def forward(self, keep=None):
         logit = self.logit
-        super().forward()
+        super().forward(keep)
         self.logit = logit
 
 class GOutputUnit(GUnit, OutputUnit):
@@ -545,6 +559,23 @@ class App(Frame):
         self.startunit = None
         self.clicked_on_a_unit = False #See http://stackoverflow.com/a/14480311 - both canvas and unit callbacks were firing
         self.clicked_on_a_connection = False
+        
+        #one binding per kind of item rather than one per item; items maps canvas ids back to their objects
+        self.items = {}
+        self.canvas.tag_bind('unitpart', "<Button-1>", self.unit_clicked)
+        self.canvas.tag_bind('connection', "<Button-1>", self.connection_clicked)
+        self.poll_units()
+    def poll_units(self):
+        #a single polling loop for every unit, only visiting the ones the run line has tagged
+        for tag in ('forward&&!forward_done', 'backprop&&!backprop_done', 'reset', 'remove'):
+            for item in self.canvas.find_withtag(tag):
+                unitref = self.items.get(item)
+                if unitref and unitref():
+                    unitref().graphic.checktags()
+        self.after(20, self.poll_units)
+    def clicked_item(self):
+        current = self.canvas.find_withtag('current')
+        return self.items.get(current[0]) if current else None
     def addunit(self, event): #fires when we click on any area of the canvas
         if self.clicked_on_a_unit:
             self.connectionconfig.clear()
@@ -568,8 +599,10 @@ class App(Frame):
                 GInputUnit(self.canvas, (event.x, event.y), [])
             elif self.options.unit_type == 'output':
                 GOutputUnit(self.canvas, (event.x, event.y))
-    def addconnection(self, unitref): #creates a method bound to each specific unit
-        return lambda event: self._addconnection(unitref, event)
+    def unit_clicked(self, event):
+        unitref = self.clicked_item()
+        if unitref:
+            self._addconnection(unitref, event)
     def _addconnection(self, targetunitref, event): #fires when we click on a unit on the canvas
         if self.clicked_on_a_connection:
             return
@@ -580,17 +613,88 @@ class App(Frame):
             else: self.startunit.add_output(targetunitref(), GConnection(self.canvas, self.startunit, targetunitref()))
             self.startunit = None
         self.startunit = targetunitref()
-    def configconnection(self, connectionref):
-        return lambda event: self._configconnection(connectionref, event)
+    def connection_clicked(self, event):
+        connectionref = self.clicked_item()
+        if connectionref:
+            self._configconnection(connectionref, event)
     def _configconnection(self, connectionref, event):
         self.startunit = None #cancel any ideas we had before about linking units
         self.clicked_on_a_connection = True
         self.connectionconfig.show(connectionref())
+    
+    def open_network(self, path):
+        import serialize
+        self.load_network(serialize.load(path))
+    def load_network(self, groups, column_width=150, row_height=50, rows=12):
+        """Build GUnits and GConnections copying a whole network of units.py groups at once.
+        Each group gets its own columns of at most `rows` units. Messages, recoloring and
+        position lookups are all skipped per item; everything is repainted once at the end."""
+        MessageDisplay.set("Loading network...")
+        positions = {}
+        created = {}
+        connections = []
+        column = 0
+        with MessageDisplay.suppressed():
+            Graphic.paused = True
+            try:
+                for group in groups:
+                    for number, unit in enumerate(group.units):
+                        position = (40 + (column + number // rows) * column_width, 20 + (number % rows) * row_height)
+                        if isinstance(unit, InputUnit):
+                            gunit = GInputUnit(self.canvas, position, dropout=unit.dropout)
+                        elif isinstance(unit, OutputUnit):
+                            gunit = GOutputUnit(self.canvas, position, unit.cost_function, unit.cost_derivative,
+                                                nonlinearity=unit.nonlinearity, nonlinearity_deriv=unit.nonlinearity_deriv, dropout=unit.dropout)
+                        else:
+                            gunit = GUnit(self.canvas, position, [], unit.nonlinearity, unit.nonlinearity_deriv, unit.dropout)
+                        created[id(unit)] = gunit
+                        positions[id(unit)] = position
+                    column += (len(group.units) + rows - 1) // rows
+                #edges are added list by list as connect() does, skipping add_output's throwaway Connection per edge
+                incoming = {}
+                for group in groups:
+                    for unit in group.units:
+                        source = created[id(unit)]
+                        start = positions[id(unit)]
+                        outputs = []
+                        weights = []
+                        for output, weight in zip(unit.outputs, unit.weights):
+                            if id(output) not in created:
+                                continue
+                            connection = GConnection(self.canvas, source, created[id(output)], weight.value,
+                                                     weight.plasticity, weight.momentum, weight.decay,
+                                                     startpos=(start[0]+UnitGraphic.bigsize+2*UnitGraphic.smallsize, start[1]),
+                                                     endpos=positions[id(output)])
+                            outputs.append(created[id(output)])
+                            weights.append(connection)
+                            sources, source_weights = incoming.setdefault(id(output), ([], []))
+                            sources.append(source)
+                            source_weights.append(connection)
+                        source.outputs.extend(outputs)
+                        source.weights.extend(weights)
+                        connections.extend(weights)
+                for key, (sources, source_weights) in incoming.items():
+                    created[key].incoming_units.extend(sources)
+                    created[key].incoming_weights.extend(source_weights)
+                Unit.rewired += 1
+                for group in groups:
+                    for unit in group.units:
+                        if unit.recurrent:
+                            created[id(unit)].recurrent = True #the self connection was already copied above, so none is added
+            finally:
+                Graphic.paused = False
+        for connection in connections:
+            connection.graphic.recolor('value', connection.value)
+        MessageDisplay.set("Loaded {} units and {} connections".format(len(created), len(connections)))
+        return created
 
 
 
 if __name__ == '__main__':
+    from sys import argv as runtime_args
     root = Tk()
     app = App(root)
+    if len(runtime_args) > 1:
+        app.open_network(runtime_args[1])
     root.mainloop()
 
@@ -0,0 +1,118 @@
+from heapq import heappush, heappop
+from units import Connection, Unit
+from schedule import all_units, levels, split_edges
+from dropout import require_eval
+
+class IncrementalForward:
+    """
+    A single forward step over a list of groups that only recomputes what a change affects.
+
+    run() does a full pass from a fresh state (like SparseNetwork.infer with one step) and caches
+    every unit's logit and output. After that, a changed weight or input only adds its own delta
+    to the logit it feeds and marks that unit dirty; refresh() then recomputes dirty units in
+    dependency order and pushes just the change in each output further downstream, stopping
+    wherever an output comes out unchanged. Weight edits are picked up from Connection.observers,
+    so editing Connection.value anywhere (the GUI config frame, an online update) is enough.
+    Edges that only arrive on the next step don't affect a single step and are ignored, and so is
+    dropout: run() raises while any unit with dropout is in training mode. Inputs have to come in
+    through set_input()/update() here; InputUnit.update() on the units themselves isn't seen.
+    Adding or removing an edge anywhere (Unit.rewired) makes the next refresh rebuild the edge
+    maps and do a full run() from the current inputs.
+
+    Repeated deltas can drift from a fresh run by rounding error; run() again to resynchronise.
+    Call close() to stop watching the weights.
+    """
+    def __init__(self, groups):
+        self.groups = groups
+        self.units = all_units(groups)
+        self.inputs = list(groups[0].units)
+        self.input_ids = {id(unit) for unit in self.inputs}
+        self.rewire()
+        self.logit = {}
+        self.output = {}
+        self.dirty = []
+        self.queued = set()
+        self.recomputed = 0
+        Connection.observers.append(self.weight_changed)
+
+    def rewire(self):
+        """Take the edge maps and evaluation order afresh from the groups"""
+        self.wiring = Unit.rewired
+        self.incoming, _, self.outgoing, _ = split_edges(self.groups)
+        self.levels = levels(self.groups)
+        self.order = {}
+        for level in self.levels:
+            for unit in level:
+                self.order[id(unit)] = len(self.order)
+        self.ends = {}
+        for unit in self.units:
+            for target, weight in self.outgoing[id(unit)]:
+                self.ends[id(weight)] = (unit, target)
+
+    def close(self):
+        if self.weight_changed in Connection.observers:
+            Connection.observers.remove(self.weight_changed)
+
+    def _mark(self, unit):
+        if id(unit) not in self.queued:
+            self.queued.add(id(unit))
+            heappush(self.dirty, (self.order[id(unit)], id(unit), unit))
+
+    """Full pass from scratch; returns the last group's outputs"""
+    def run(self, values):
+        require_eval(self.units, 'IncrementalForward')
+        if self.wiring != Unit.rewired:
+            self.rewire()
+        for unit, value in zip(self.inputs, values):
+            self.logit[id(unit)] = value
+        for level in self.levels:
+            for unit in level:
+                logit = self.logit[id(unit)] if id(unit) in self.input_ids else 0
+                for source, weight in self.incoming[id(unit)]:
+                    logit += weight * self.output[id(source)]
+                self.logit[id(unit)] = logit
+                self.output[id(unit)] = unit.nonlinearity(logit)
+        self.dirty = []
+        self.queued = set()
+        return self.outputs()
+
+    def set_input(self, index, value):
+        unit = self.inputs[index]
+        self.logit[id(unit)] = value
+        self._mark(unit)
+
+    def update(self, values):
+        for index, value in enumerate(values):
+            if value != self.logit[id(self.inputs[index])]:
+                self.set_input(index, value)
+
+    def weight_changed(self, connection, old, new):
+        if self.wiring != Unit.rewired:
+            return #the edge maps are stale; refresh() starts over anyway
+        ends = self.ends.get(id(connection))
+        if ends is None or old is None or id(ends[0]) not in self.output:
+            return
+        source, target = ends
+        self.logit[id(target)] += (new - old) * self.output[id(source)]
+        self._mark(target)
+
+    """Recompute every dirty unit, downstream ones last, touching nothing else"""
+    def refresh(self):
+        if self.wiring != Unit.rewired and self.output:
+            self.run([self.logit[id(unit)] for unit in self.inputs])
+            return
+        while self.dirty:
+            _, key, unit = heappop(self.dirty)
+            self.queued.discard(key)
+            output = unit.nonlinearity(self.logit[key])
+            change = output - self.output[key]
+            self.output[key] = output
+            self.recomputed += 1
+            if change:
+                for target, weight in self.outgoing[key]:
+                    self.logit[id(target)] += weight * change
+                    self._mark(target)
+
+    def outputs(self):
+        self.refresh()
+        return [self.output[id(unit)] for unit in self.groups[-1].units]
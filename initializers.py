@@ -0,0 +1,20 @@
+from math import sqrt
+from random import gauss
+
+#predefine some weight initializers for people to use
+#each one fills a whole block of weights at once - (fan_in, fan_out, count) -> list of count starting values
+
+def gaussian(fan_in, fan_out, count, std=1):
+    return [gauss(0, std) for _ in range(count)]
+
+def xavier(fan_in, fan_out, count):
+    return gaussian(fan_in, fan_out, count, sqrt(2 / max(1, fan_in + fan_out)))
+
+def he(fan_in, fan_out, count):
+    return gaussian(fan_in, fan_out, count, sqrt(2 / max(1, fan_in)))
+
+possible_initializers = {
+    'gaussian': gaussian,
+    'xavier': xavier,
+    'he': he
+    }
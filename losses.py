@@ -0,0 +1,62 @@
+from math import exp, log
+
+#predefine some group-level losses for people to use
+#each takes a batch of output rows and a batch of target rows (one row per sample) and returns
+#(mean loss over the batch, gradient rows with respect to the outputs)
+#gradients are per sample, the same way OutputUnit's cost_derivative gives them
+
+epsilon = 1e-12
+
+def mse(outputs, targets):
+    total = 0
+    gradients = []
+    for output, target in zip(outputs, targets):
+        errors = [y - t for y, t in zip(output, target)]
+        total += sum(error * error for error in errors) / len(errors)
+        gradients.append(errors)
+    return total / len(outputs), gradients
+
+def binary_crossentropy(outputs, targets):
+    """Outputs are independent probabilities, e.g. from sigmoid units"""
+    total = 0
+    gradients = []
+    for output, target in zip(outputs, targets):
+        clipped = [min(1 - epsilon, max(epsilon, y)) for y in output]
+        total -= sum(t * log(y) + (1 - t) * log(1 - y) for y, t in zip(clipped, target)) / len(clipped)
+        gradients.append([(y - t) / (y * (1 - y)) for y, t in zip(clipped, target)])
+    return total / len(outputs), gradients
+
+def categorical_crossentropy(outputs, targets):
+    """Outputs are already a probability distribution over the units"""
+    total = 0
+    gradients = []
+    for output, target in zip(outputs, targets):
+        clipped = [max(epsilon, y) for y in output]
+        total -= sum(t * log(y) for y, t in zip(clipped, target) if t)
+        gradients.append([-t / y for y, t in zip(clipped, target)])
+    return total / len(outputs), gradients
+
+def softmax(logits):
+    shift = max(logits)
+    exps = [exp(z - shift) for z in logits]
+    total = sum(exps)
+    return [e / total for e in exps]
+
+def softmax_crossentropy(outputs, targets):
+    """Softmax over the outputs and cross-entropy in one step; use with linear output units.
+    The fused gradient softmax - target never forms a log or divides by a probability."""
+    total = 0
+    gradients = []
+    for output, target in zip(outputs, targets):
+        shift = max(output)
+        log_total = shift + log(sum(exp(z - shift) for z in output))
+        total += sum(t * (log_total - z) for z, t in zip(output, target) if t)
+        gradients.append([p - t for p, t in zip(softmax(output), target)])
+    return total / len(outputs), gradients
+
+possible_losses = {
+    'mse': mse,
+    'binary_crossentropy': binary_crossentropy,
+    'categorical_crossentropy': categorical_crossentropy,
+    'softmax_crossentropy': softmax_crossentropy
+    }
@@ -0,0 +1,227 @@
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from operator import mul
+from types import SimpleNamespace
+from units import Connection
+from dropout import require_eval
+from sparse import SparseNetwork
+
+def all_units(groups):
+    return [unit for group in groups for unit in group.units]
+
+def split_edges(groups):
+    """
+    Sort every edge between the units of groups by when it is seen, as Group.go() does with
+    freeze()/thaw(): an edge into a later group arrives within the same step, while an edge into
+    the same or an earlier group only arrives on the next step.
+    Returns four dicts keyed by id(unit) of (unit, weight) pairs:
+    incoming immediate, incoming delayed, outgoing immediate, outgoing delayed.
+    """
+    position = {}
+    for number, group in enumerate(groups):
+        for unit in group.units:
+            position[id(unit)] = number
+    edges = tuple({id(unit): [] for unit in all_units(groups)} for _ in range(4))
+    incoming, incoming_delayed, outgoing, outgoing_delayed = edges
+    for group in groups:
+        for unit in group.units:
+            for target, weight in zip(unit.outputs, unit.weights):
+                if id(target) not in position:
+                    continue
+                if position[id(unit)] < position[id(target)]:
+                    incoming[id(target)].append((unit, weight))
+                    outgoing[id(unit)].append((target, weight))
+                else:
+                    incoming_delayed[id(target)].append((unit, weight))
+                    outgoing_delayed[id(unit)].append((target, weight))
+    return edges
+
+def levels(groups):
+    """Split the units into wavefronts: within a step, every unit only depends on units in earlier levels"""
+    incoming = split_edges(groups)[0]
+    depth = {}
+    result = []
+    #groups are already in dependency order for immediate edges, so one pass settles every depth
+    for unit in all_units(groups):
+        level = 1 + max((depth[id(source)] for source, _ in incoming[id(unit)]), default=-1)
+        depth[id(unit)] = level
+        if level == len(result):
+            result.append([])
+        result[level].append(unit)
+    return result
+
+#the per-level work, shared by the main process and the pool workers; state is a LevelScheduler or a worker's view of one
+def forward_rows(state, start, stop):
+    weights, logit, output, output_deriv = state.weights, state.carry, state.output, state.output_deriv
+    nonlinearities, derivs = state.nonlinearities, state.nonlinearity_derivs
+    pointers, columns, offset = state.feedforward
+    for row in range(start, stop):
+        first, last = pointers[row], pointers[row + 1]
+        total = logit[row]
+        if first != last:
+            total += sum(map(mul, weights[first:last], map(output.__getitem__, columns[first:last])))
+        value = nonlinearities[row](total)
+        output[row] = value
+        output_deriv[row] = derivs[row](value)
+
+def carry_rows(state, start, stop):
+    #what send() would have left in logit for the next step
+    weights, carry, output = state.weights, state.carry, state.output
+    pointers, columns, offset = state.delayed
+    for row in range(start, stop):
+        first, last = pointers[row], pointers[row + 1]
+        carry[row] = sum(map(mul, weights[offset + first:offset + last], map(output.__getitem__, columns[first:last]))) if first != last else 0.0
+
+def backward_rows(state, start, stop, costs, limit):
+    weights, gradients, output, output_deriv = state.weights, state.gradients, state.output, state.output_deriv
+    delta, later = state.delta, state.later
+    edge_sets = ((state.feedforward_t, delta), (state.delayed_t, later))
+    for row in range(start, stop):
+        outdelta = 0.0
+        value = output[row]
+        for (pointers, rows, edges), deltas in edge_sets:
+            for k in range(pointers[row], pointers[row + 1]):
+                edge = edges[k]
+                target_delta = deltas[rows[k]]
+                outdelta += weights[edge] * target_delta
+                gradient = gradients[edge] + target_delta * value
+                if gradient > limit: gradient = limit
+                elif gradient < -limit: gradient = -limit
+                gradients[edge] = gradient
+        if row in costs:
+            outdelta = costs[row]
+        delta[row] = outdelta * output_deriv[row]
+
+_memory = []
+_state = None
+def attach(buffers, static):
+    """Worker initializer: map the scheduler's shared buffers once per process"""
+    global _memory, _state
+    views = {}
+    for name, memory_name, typecode in buffers:
+        memory = shared_memory.SharedMemory(name=memory_name)
+        _memory.append(memory)
+        views[name] = memory.buf.cast(typecode)
+    _state = SimpleNamespace(**static, **views)
+
+def work(kernel, start, stop, *args):
+    kernel(_state, start, stop, *args)
+
+class LevelScheduler(SparseNetwork):
+    """
+    Runs the units of a list of groups level by level instead of one group at a time.
+
+    The units are laid out as SparseNetwork's CSR arrays, ordered by level, so each level is one
+    contiguous slice of rows. go() and backprop() give the same results as SparseNetwork, up to
+    the order floating point sums are taken in, and infer(), commit() and sync() are shared with it.
+    No row writes to another row's state or to another row's edges, so with workers=n every level
+    longer than chunksize rows is split into n slices that run at once in a process pool. The
+    weights, gradients and per-step buffers then live in shared memory and the pool reads and
+    writes them in place; only row ranges travel between processes. The nonlinearities are handed
+    to the workers when they start, so with a start method other than fork they must be picklable
+    module-level functions. Call close() when done with a pool.
+    """
+    #per-step buffers, by name and typecode (None for the network's precision)
+    buffers = (('carry', 'd'), ('output', None), ('output_deriv', None), ('delta', 'd'), ('later', 'd'))
+
+    def __init__(self, groups, workers=None, chunksize=64, precision='float64'):
+        super().__init__(groups, precision)
+        self.workers = workers
+        self.chunksize = chunksize
+        self.pool = None
+        self.memory = []
+        if workers:
+            self._share(workers)
+
+    def arrange(self, groups):
+        return levels(groups)
+
+    def _share(self, workers):
+        """Move the weights, gradients and per-step buffers into shared memory and start the pool"""
+        shared = []
+        for name, typecode in (('weights', self.typecode), ('gradients', 'd')) + self.buffers:
+            typecode = typecode or self.typecode
+            values = getattr(self, name)
+            memory = shared_memory.SharedMemory(create=True, size=max(1, len(values) * array(typecode).itemsize))
+            view = memory.buf.cast(typecode)
+            view[:len(values)] = array(typecode, values)
+            self.memory.append(memory)
+            setattr(self, name, view[:len(values)])
+            view.release()
+            shared.append((name, memory.name, typecode))
+        static = {name: getattr(self, name) for name in
+                  ('feedforward', 'delayed', 'feedforward_t', 'delayed_t', 'nonlinearities', 'nonlinearity_derivs')}
+        self.pool = ProcessPoolExecutor(workers, initializer=attach, initargs=(shared, static))
+
+    def _run(self, kernel, start, stop, *args):
+        if self.pool is None or stop - start <= self.chunksize:
+            kernel(self, start, stop, *args)
+        else:
+            size = max(self.chunksize, -(-(stop - start) // self.workers))
+            slices = [self.pool.submit(work, kernel, first, min(first + size, stop), *args)
+                      for first in range(start, stop, size)]
+            for piece in slices:
+                piece.result()
+
+    def reset(self):
+        for name, typecode in self.buffers:
+            buffer = self.__dict__.get(name)
+            zeros = array(typecode or self.typecode, bytes(array(typecode or self.typecode).itemsize * len(self.units)))
+            if buffer is None:
+                setattr(self, name, zeros)
+            else:
+                buffer[:] = zeros
+        self.hidden_state = []
+        self.derivative = []
+
+    def _copy(self, buffer):
+        history = array(self.typecode)
+        history.frombytes(memoryview(buffer).cast('B'))
+        return history
+
+    """Run one time step, feeding values to the first group if given. Returns the last group's outputs."""
+    def go(self, values=None):
+        require_eval(self.dropout_units, type(self).__name__)
+        if values is not None:
+            for row, value in zip(self.input_rows, values):
+                self.carry[row] = value
+        for start, stop in self.bounds:
+            self._run(forward_rows, start, stop)
+        self.hidden_state.append(self._copy(self.output))
+        self.derivative.append(self._copy(self.output_deriv))
+        self._run(carry_rows, 0, len(self.units))
+        return [self.output[row] for row in self.last_rows]
+
+    """Backprop one time step, latest level first. targets, if given, set the deltas of the
+    output units as OutputGroup.cost does, and the mean cost over them is returned."""
+    def backprop(self, targets=None, commit=True):
+        self.output[:] = self.hidden_state.pop()
+        self.output_deriv[:] = self.derivative.pop()
+        self.later[:] = self.delta #deltas from the step after this one, for delayed edges
+        cost_val = 0
+        costs = {}
+        if targets is not None:
+            for row, target in zip(self.output_rows, targets):
+                unit = self.units[row]
+                cost_val += unit.cost_function(self.output[row], target)
+                costs[row] = unit.cost_derivative(self.output[row], target)
+            cost_val /= len(self.output_rows)
+        for start, stop in reversed(self.bounds):
+            self._run(backward_rows, start, stop, costs, Connection.max_magnitude)
+        if commit:
+            self.commit()
+        return cost_val
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+            for name, typecode in (('weights', None), ('gradients', None)) + self.buffers:
+                view = getattr(self, name)
+                setattr(self, name, array(view.format, view))
+                view.release()
+            for memory in self.memory:
+                memory.close()
+                memory.unlink()
+            self.memory = []
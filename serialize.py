@@ -0,0 +1,72 @@
+import json
+from units import Connection, Group, InputGroup, OutputGroup, Unit, InputUnit, OutputUnit
+from nonlinearities import possible_nonlinearities as nonlins
+
+#saved networks are plain JSON: a list of groups of units, and a list of connections between them by unit number
+group_kinds = {'input': (InputGroup, InputUnit), 'hidden': (Group, Unit), 'output': (OutputGroup, OutputUnit)}
+
+def kind_of(group):
+    if isinstance(group, InputGroup): return 'input'
+    if isinstance(group, OutputGroup): return 'output'
+    return 'hidden'
+
+def nonlinearity_name(function):
+    #only registered nonlinearities can be found again by load(), so anything else fails here rather than there
+    for name, functions in nonlins.items():
+        if functions[0] is function:
+            return name
+    raise ValueError("can't save nonlinearity {!r}: only functions in possible_nonlinearities can be saved".format(function))
+
+def to_dict(groups):
+    numbers = {}
+    saved_groups = []
+    for group in groups:
+        saved_units = []
+        for unit in group.units:
+            numbers[id(unit)] = len(numbers)
+            saved_units.append({'nonlinearity': nonlinearity_name(unit.nonlinearity),
+                                'dropout': unit.dropout, 'recurrent': bool(unit.recurrent)})
+        saved_groups.append({'kind': kind_of(group), 'units': saved_units})
+    connections = []
+    for group in groups:
+        for unit in group.units:
+            for output, weight in zip(unit.outputs, unit.weights):
+                if id(output) in numbers:
+                    connections.append([numbers[id(unit)], numbers[id(output)],
+                                        weight.value, weight.plasticity, weight.momentum, weight.decay])
+    return {'groups': saved_groups, 'connections': connections}
+
+def from_dict(saved):
+    """Rebuild groups from to_dict() output. Output units get the default cost functions,
+    since those can be arbitrary lambdas and are not saved."""
+    groups = []
+    units = []
+    for saved_group in saved['groups']:
+        group_class, unit_class = group_kinds[saved_group['kind']]
+        group = group_class(0, [])
+        for saved_unit in saved_group['units']:
+            if unit_class is OutputUnit:
+                unit = OutputUnit(nonlinearity=nonlins[saved_unit['nonlinearity']][0],
+                                  nonlinearity_deriv=nonlins[saved_unit['nonlinearity']][1], dropout=saved_unit['dropout'])
+            elif unit_class is InputUnit:
+                unit = InputUnit(dropout=saved_unit['dropout'])
+            else:
+                unit = Unit(nonlinearity=nonlins[saved_unit['nonlinearity']][0],
+                            nonlinearity_deriv=nonlins[saved_unit['nonlinearity']][1], dropout=saved_unit['dropout'])
+            #the saved self-connection comes back with the rest, so don't let the constructor add a fresh one
+            unit.recurrent = saved_unit['recurrent']
+            group.units.append(unit)
+            units.append(unit)
+        groups.append(group)
+    for source, target, value, plasticity, momentum, decay in saved['connections']:
+        units[source].add_output(units[target], Connection(value, plasticity, momentum, decay))
+    return groups
+
+def save(groups, path):
+    network = to_dict(groups) #before opening, so an unsaveable network leaves an existing file alone
+    with open(path, 'w') as saved:
+        json.dump(network, saved)
+
+def load(path):
+    with open(path) as saved:
+        return from_dict(json.load(saved))
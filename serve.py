@@ -0,0 +1,154 @@
+import asyncio
+import json
+from math import isfinite
+from argparse import ArgumentParser
+from serialize import load
+from sparse import SparseNetwork
+
+class Batcher:
+    """
+    Collects concurrent requests and answers them with one batched forward pass.
+
+    A batch is closed as soon as it holds max_batch requests or max_delay seconds after its first
+    request arrived, whichever comes first. The forward pass runs in a worker thread so requests
+    keep being accepted (and the next batch keeps filling) while it computes.
+    """
+    def __init__(self, network, max_batch=64, max_delay=0.005, steps=1):
+        self.network = network
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.steps = steps
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.requests = 0
+
+    async def submit(self, inputs):
+        result = asyncio.get_running_loop().create_future()
+        await self.queue.put((inputs, result))
+        return await result
+
+    def infer_each(self, batch):
+        """Run samples one at a time, giving each its outputs or the exception it raised"""
+        outputs = []
+        for inputs in batch:
+            try:
+                outputs.append(self.network.infer([inputs], self.steps)[0])
+            except Exception as error:
+                outputs.append(error)
+        return outputs
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(pending) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            batch = [inputs for inputs, _ in pending]
+            try:
+                outputs = await loop.run_in_executor(None, self.network.infer, batch, self.steps)
+            except Exception:
+                #one bad sample (say, one that overflows a nonlinearity) shouldn't fail the others
+                outputs = await loop.run_in_executor(None, self.infer_each, batch)
+            for (_, result), output in zip(pending, outputs):
+                if result.done():
+                    continue
+                if isinstance(output, Exception):
+                    result.set_exception(output)
+                else:
+                    result.set_result(output)
+            self.batches += 1
+            self.requests += len(pending)
+
+class Server:
+    """Minimal HTTP/1.1 front end: POST a JSON body {"inputs": [...]} and get back {"outputs": [...]}.
+    GET /stats reports how many requests and batches have been served."""
+    def __init__(self, batcher, input_size):
+        self.batcher = batcher
+        self.input_size = input_size
+
+    async def respond(self, writer, status, body):
+        data = json.dumps(body).encode()
+        writer.write("HTTP/1.1 {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n".format(status, len(data)).encode() + data)
+        await writer.drain()
+
+    async def answer(self, method, path, body):
+        """The status line and JSON body for one request"""
+        if method == 'GET' and path == '/stats':
+            return '200 OK', {'requests': self.batcher.requests, 'batches': self.batcher.batches}
+        try:
+            inputs = json.loads(body)['inputs']
+            if not isinstance(inputs, list):
+                raise TypeError("inputs must be a list")
+            inputs = [float(value) for value in inputs]
+            if not all(map(isfinite, inputs)):
+                raise ValueError("inputs must be finite")
+        except (ValueError, KeyError, TypeError):
+            return '400 Bad Request', {'error': 'expected {"inputs": [finite numbers]}'}
+        if len(inputs) != self.input_size:
+            return '400 Bad Request', {'error': 'expected {} inputs'.format(self.input_size)}
+        try:
+            outputs = await self.batcher.submit(inputs)
+        except Exception as error:
+            return '500 Internal Server Error', {'error': '{}: {}'.format(type(error).__name__, error)}
+        if not all(map(isfinite, outputs)):
+            return '500 Internal Server Error', {'error': 'outputs are not finite'}
+        return '200 OK', {'outputs': outputs}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path = request_line.decode().split()[:2]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode().partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                status, reply = await self.answer(method, path, body)
+                await self.respond(writer, status, reply)
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+async def serve(network_path, host='127.0.0.1', port=8000, socket=None, max_batch=64, max_delay=0.005, steps=1):
+    groups = load(network_path)
+    batcher = Batcher(SparseNetwork(groups), max_batch, max_delay, steps)
+    server = Server(batcher, len(groups[0].units))
+    if socket:
+        listener = await asyncio.start_unix_server(server.handle, path=socket)
+    else:
+        listener = await asyncio.start_server(server.handle, host, port)
+    print("Serving {} on {}".format(network_path, socket or "http://{}:{}".format(host, port)))
+    async with listener:
+        await asyncio.gather(listener.serve_forever(), batcher.run())
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Serve a saved network, batching concurrent requests into one forward pass")
+    parser.add_argument('network', help="network file written by serialize.save")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--socket', help="listen on this unix socket instead of localhost")
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-delay-ms', type=float, default=5)
+    parser.add_argument('--steps', type=int, default=1, help="time steps to hold each input for (recurrent networks)")
+    options = parser.parse_args()
+    try:
+        asyncio.run(serve(options.network, options.host, options.port, options.socket,
+                          options.max_batch, options.max_delay_ms / 1000, options.steps))
+    except KeyboardInterrupt:
+        pass
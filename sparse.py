@@ -0,0 +1,235 @@
+import struct
+from array import array
+from operator import mul
+from units import Connection, OutputUnit, precisions
+from dropout import require_eval
+
+#integer views of each typecode, used to step a rounded value one unit in the last place
+_bit_formats = {'f': ('f', 'I'), 'd': ('d', 'Q')}
+def toward_zero(value, typecode):
+    float_format, int_format = _bit_formats[typecode]
+    bits = struct.unpack(int_format, struct.pack(float_format, value))[0]
+    return struct.unpack(float_format, struct.pack(int_format, bits - 1))[0]
+
+class SparseNetwork:
+    """
+    Compressed-sparse-row execution engine for the units in a list of groups.
+
+    Running go() once is equivalent to calling go() on each group in list order, and backprop()
+    walks the groups in reverse, but the unit graph is held as flat CSR arrays instead of being
+    traversed through Unit objects. Each unit is a row listing its incoming edges, so the forward
+    pass is a sparse matrix-vector product and the backward pass is the transposed product.
+
+    Edges are split the same way Group.go() freezes and thaws: an edge into a later group is
+    seen within the same step, while an edge into the same group (including recurrent self loops)
+    or an earlier group only arrives on the next step, so delayed edges backprop the deltas of
+    the following time step. Results match the object path up to the order floating point sums
+    are taken in.
+
+    Dropout is not applied: go() raises while any unit with dropout is in training mode, and
+    infer() always runs as in evaluation. Weights are copied out of the Connections when the
+    network is built. Gradients are committed back through Connection.update so momentum, decay
+    and clipping behave as usual; call sync() after editing Connections directly.
+    """
+    def __init__(self, groups, precision='float64'):
+        self.groups = groups
+        self.typecode = precisions[precision] or 'd'
+        self.units = []
+        self.bounds = []
+        for block in self.arrange(groups):
+            self.bounds.append((len(self.units), len(self.units) + len(block)))
+            self.units.extend(block)
+        index = {id(unit): row for row, unit in enumerate(self.units)}
+        group_of = [None] * len(self.units)
+        for number, group in enumerate(groups):
+            for unit in group.units:
+                group_of[index[id(unit)]] = number
+        self.dropout_units = [unit for unit in self.units if unit.dropout]
+        self.nonlinearities = [unit.nonlinearity for unit in self.units]
+        self.nonlinearity_derivs = [unit.nonlinearity_deriv for unit in self.units]
+        self.input_rows = [index[id(unit)] for unit in groups[0].units] if groups else []
+        self.last_rows = [index[id(unit)] for unit in groups[-1].units] if groups else []
+        self.output_rows = [index[id(unit)] for group in groups for unit in group.units if isinstance(unit, OutputUnit)]
+
+        #split every incoming edge into this step's (feedforward) and next step's (delayed) edge sets
+        feedforward = ([], [])
+        delayed = ([], [])
+        for row, unit in enumerate(self.units):
+            for edges in feedforward + delayed:
+                edges.append([])
+            for source, weight in zip(unit.incoming_units, unit.incoming_weights):
+                column = index.get(id(source))
+                if column is None:
+                    continue #units outside the groups only ever contribute zero
+                edges = feedforward if group_of[column] < group_of[row] else delayed
+                edges[0][row].append(column)
+                edges[1][row].append(weight)
+        #weights are stored in row order, feedforward edges first, so a row's weights are one slice
+        self.connections = [weight for row in feedforward[1] + delayed[1] for weight in row]
+        self.weights = array(self.typecode, bytes(array(self.typecode).itemsize * len(self.connections)))
+        self.sync()
+        self.gradients = array('d', bytes(8 * len(self.connections)))
+        self.feedforward = self._compress(feedforward[0], 0)
+        self.delayed = self._compress(delayed[0], len(self.feedforward[1]))
+        self.feedforward_t = self._transpose(self.feedforward)
+        self.delayed_t = self._transpose(self.delayed)
+        self.reset()
+
+    def arrange(self, groups):
+        """The blocks of units rows are evaluated in, in order. A unit may only take feedforward
+        edges from units in earlier blocks; here every group is one block."""
+        return [group.units for group in groups]
+
+    def _compress(self, columns, offset):
+        """Flatten per-row column lists into (row pointers, column indexes, offset of the first weight)"""
+        pointers = array('l', [0])
+        flat_columns = array('l')
+        for row_columns in columns:
+            flat_columns.extend(row_columns)
+            pointers.append(len(flat_columns))
+        return pointers, flat_columns, offset
+
+    def _transpose(self, matrix):
+        """The same edges indexed by source unit, as (pointers, target rows, weight indexes), for the backward pass"""
+        pointers, columns, offset = matrix
+        by_source = [[] for _ in self.units]
+        by_edge = [[] for _ in self.units]
+        for row in range(len(self.units)):
+            for k in range(pointers[row], pointers[row + 1]):
+                by_source[columns[k]].append(row)
+                by_edge[columns[k]].append(offset + k)
+        transposed = self._compress(by_source, 0)
+        return transposed[0], transposed[1], array('l', (edge for edges in by_edge for edge in edges))
+
+    def reset(self):
+        size = len(self.units)
+        self.carry = array('d', bytes(8 * size))
+        self.output = array(self.typecode, bytes(array(self.typecode).itemsize * size))
+        self.delta = array('d', bytes(8 * size))
+        self.hidden_state = []
+        self.derivative = []
+
+    def sync(self):
+        """Reload weights from the Connections after they were changed outside the engine"""
+        for edge, weight in enumerate(self.connections):
+            self.store(edge, weight.value)
+
+    def store(self, edge, value):
+        """Copy a weight in at the network's precision, keeping it within Connection.max_magnitude:
+        rounding can carry a clipped value just past the limit when the limit isn't representable"""
+        weights = self.weights
+        weights[edge] = value
+        if abs(weights[edge]) > Connection.max_magnitude >= abs(value):
+            weights[edge] = toward_zero(weights[edge], self.typecode)
+
+    """Run one time step, feeding values to the first group if given. Returns the last group's outputs."""
+    def go(self, values=None):
+        require_eval(self.dropout_units, type(self).__name__)
+        logit = self.carry
+        if values is not None:
+            for row, value in zip(self.input_rows, values):
+                logit[row] = value
+        weights = self.weights
+        output = array(self.typecode, self.output)
+        derivative = array(self.typecode, output)
+        pointers, columns, offset = self.feedforward
+        for start, stop in self.bounds:
+            for row in range(start, stop):
+                first, last = pointers[row], pointers[row + 1]
+                total = logit[row]
+                if first != last:
+                    total += sum(map(mul, weights[first:last], map(output.__getitem__, columns[first:last])))
+                value = self.nonlinearities[row](total)
+                output[row] = value
+                derivative[row] = self.nonlinearity_derivs[row](value)
+        #delayed edges land in next step's logits, like frozenlogit after thaw()
+        carry = array('d', bytes(8 * len(self.units)))
+        pointers, columns, offset = self.delayed
+        for row in range(len(self.units)):
+            first, last = pointers[row], pointers[row + 1]
+            if first != last:
+                carry[row] = sum(map(mul, weights[offset + first:offset + last], map(output.__getitem__, columns[first:last])))
+        self.carry = carry
+        self.output = output
+        self.hidden_state.append(output)
+        self.derivative.append(derivative)
+        return [output[row] for row in self.last_rows]
+
+    """Run a batch of independent samples from a fresh state, without touching the training state
+    or keeping history. Each sample is held for steps time steps; returns one list of last-group
+    outputs per sample. Every edge is visited once per step for the whole batch."""
+    def infer(self, batch, steps=1):
+        size = len(batch)
+        weights = self.weights
+        inputs = dict(zip(self.input_rows, zip(*batch)))
+        carry = [None] * len(self.units)
+        for step in range(steps):
+            output = [None] * len(self.units)
+            pointers, columns, offset = self.feedforward
+            for start, stop in self.bounds:
+                for row in range(start, stop):
+                    if row in inputs:
+                        logits = list(inputs[row])
+                    else:
+                        logits = carry[row] or [0.0] * size
+                    for k in range(pointers[row], pointers[row + 1]):
+                        weight = weights[k]
+                        logits = [logit + weight * value for logit, value in zip(logits, output[columns[k]])]
+                    output[row] = list(map(self.nonlinearities[row], logits))
+            pointers, columns, offset = self.delayed
+            for row in range(len(self.units)):
+                logits = None
+                for k in range(pointers[row], pointers[row + 1]):
+                    weight = weights[offset + k]
+                    logits = [logit + weight * value for logit, value in zip(logits or [0.0] * size, output[columns[k]])]
+                carry[row] = logits
+        return [list(sample) for sample in zip(*(output[row] for row in self.last_rows))]
+
+    """Backprop one time step, newest first. If targets are given they set the deltas of the
+    output units, as OutputGroup.cost does, and the mean cost over those units is returned."""
+    def backprop(self, targets=None, commit=True):
+        output = self.hidden_state.pop()
+        derivative = self.derivative.pop()
+        weights = self.weights
+        gradients = self.gradients
+        later = self.delta #deltas from the step after this one, for delayed edges
+        delta = array('d', later)
+        limit = Connection.max_magnitude
+        cost_val = 0
+        costs = {}
+        if targets is not None:
+            for row, target in zip(self.output_rows, targets):
+                unit = self.units[row]
+                cost_val += unit.cost_function(output[row], target)
+                costs[row] = unit.cost_derivative(output[row], target)
+            cost_val /= len(self.output_rows)
+        ff = self.feedforward_t
+        dl = self.delayed_t
+        for start, stop in reversed(self.bounds):
+            for row in range(start, stop):
+                outdelta = 0.0
+                value = output[row]
+                for (pointers, rows, edges), deltas in ((ff, delta), (dl, later)):
+                    for k in range(pointers[row], pointers[row + 1]):
+                        edge = edges[k]
+                        target_delta = deltas[rows[k]]
+                        outdelta += weights[edge] * target_delta
+                        gradient = gradients[edge] + target_delta * value
+                        if gradient > limit: gradient = limit
+                        elif gradient < -limit: gradient = -limit
+                        gradients[edge] = gradient
+                if row in costs:
+                    outdelta = costs[row]
+                delta[row] = outdelta * derivative[row]
+        self.delta = delta
+        if commit:
+            self.commit()
+        return cost_val
+
+    def commit(self):
+        """Apply the accumulated gradients through each Connection's own update rule"""
+        gradients = self.gradients
+        for edge, weight in enumerate(self.connections):
+            weight.update(gradients[edge], doclip=False)
+            self.store(edge, weight.value)
+            gradients[edge] = 0.0
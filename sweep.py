@@ -0,0 +1,172 @@
+import csv
+import random
+from array import array
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from multiprocessing import shared_memory
+from units import Group, InputGroup, OutputGroup, connect
+from nonlinearities import possible_nonlinearities as nonlins
+
+#how each update mode maps onto Connection.update's flags
+update_modes = {
+    'momentum': {'momentum': True, 'prop': False},
+    'prop': {'momentum': False, 'prop': True},
+    'plain': {'momentum': False, 'prop': False}
+    }
+
+default_grid = {
+    'plasticity': [0.001, 0.01, 0.1],
+    'momentum': [0.0, 0.6, 0.9],
+    'decay': [0.0, 0.0001],
+    'mode': ['momentum', 'prop', 'plain'],
+    'adaptive_learning_rate': [False],
+    'nonlinearity': list(nonlins)
+    }
+
+#settings Connection.update only reads in one mode; elsewhere they are pinned to their first grid value
+mode_settings = {'momentum': 'momentum', 'decay': 'momentum'}
+
+def configurations(grid):
+    """Every distinct combination of the grid's values. Combinations that only differ in a setting
+    their mode ignores would train identically, so each is run once; momentum mode with no momentum
+    and no decay is plain gradient descent, and runs as that."""
+    names = list(grid)
+    unique = {}
+    for values in product(*(grid[name] for name in names)):
+        config = dict(zip(names, values))
+        for name, mode in mode_settings.items():
+            if name in config and config.get('mode', mode) != mode:
+                config[name] = grid[name][0]
+        if config.get('mode') == 'momentum' and not config.get('momentum') and not config.get('decay'):
+            config['mode'] = 'plain'
+            for name in mode_settings:
+                if name in config:
+                    config[name] = grid[name][0]
+        unique.setdefault(tuple(config.values()), config)
+    return list(unique.values())
+
+class SharedDataset:
+    """Training samples packed into one block of shared memory, so worker processes read the
+    same copy instead of each receiving (or reloading) their own"""
+    def __init__(self, samples):
+        self.rows = len(samples)
+        self.input_size = len(samples[0][0])
+        self.target_size = len(samples[0][1])
+        width = self.input_size + self.target_size
+        self.memory = shared_memory.SharedMemory(create=True, size=max(8, 8 * self.rows * width))
+        values = self.memory.buf.cast('d')
+        for row, (inputs, targets) in enumerate(samples):
+            values[row * width:(row + 1) * width] = array('d', list(inputs) + list(targets))
+        values.release()
+    def description(self):
+        return self.memory.name, self.rows, self.input_size, self.target_size
+    def close(self):
+        self.memory.close()
+        self.memory.unlink()
+
+_memory = None
+_dataset = None
+def attach(name, rows, input_size, target_size):
+    """Worker initializer: map the shared samples once per process, read-only from here on"""
+    global _dataset, _memory
+    _memory = shared_memory.SharedMemory(name=name)
+    values = _memory.buf.cast('d')
+    width = input_size + target_size
+    _dataset = [(values[row * width:row * width + input_size], values[row * width + input_size:(row + 1) * width])
+                for row in range(rows)]
+
+def build(sizes, config):
+    function, derivative = nonlins[config['nonlinearity']][:2]
+    settings = {'plasticity': config['plasticity'], 'momentum': config['momentum'], 'decay': config['decay']}
+    layers = [InputGroup(sizes[0], [])]
+    layers.extend(Group(size, nonlinearity=function, nonlinearity_deriv=derivative) for size in sizes[1:-1])
+    layers.append(OutputGroup(sizes[-1], nonlinearity=function, nonlinearity_deriv=derivative))
+    connections = []
+    for source, target in zip(layers, layers[1:]):
+        connections.extend(connect(source, target, **settings))
+    return layers, connections
+
+def train(sizes, config, epochs, seed=0, state=None):
+    """Train one configuration on the shared dataset for `epochs` more epochs, from scratch or from
+    the state an earlier call returned. Returns the mean cost of the final epoch and the state to
+    resume from, so training in several calls ends exactly where one long call would."""
+    random.seed(seed)
+    layers, connections = build(sizes, config)
+    order = list(range(len(_dataset)))
+    if state is not None:
+        random_state, order, weights = state
+        random.setstate(random_state)
+        for weight, (value, moment, previous_delta, plasticity) in zip(connections, weights):
+            weight.value = value
+            weight.moment = moment
+            weight.previous_delta = previous_delta
+            weight.plasticity = plasticity
+    flags = dict(update_modes[config['mode']], adaptive_learning_rate=config['adaptive_learning_rate'])
+    cost_val = float('nan')
+    for epoch in range(epochs):
+        random.shuffle(order)
+        total = 0
+        for row in order:
+            inputs, targets = _dataset[row]
+            layers[0].update(inputs)
+            for layer in layers:
+                layer.go()
+            total += layers[-1].cost(targets, False)
+            for layer in reversed(layers[:-1]):
+                layer.backprop(False)
+            for weight in connections:
+                weight.update(0, **flags)
+        cost_val = total / len(order)
+        if cost_val != cost_val: #diverged
+            break
+    weights = [(weight.value, weight.moment, weight.previous_delta, weight.plasticity) for weight in connections]
+    return cost_val, (random.getstate(), order, weights)
+
+def run_sweep(samples, sizes, grid=default_grid, epochs=1, rungs=3, keep=1/3, workers=None, seed=0, path=None):
+    """
+    Successive halving over every configuration in grid: each rung trains all surviving
+    configurations (in a process pool) up to twice as many epochs as the last, carrying on from
+    where the last rung left them, then keeps only the best `keep` fraction. Losers are dropped
+    after the cheap early rungs rather than trained to the end. Returns result rows, best first,
+    and writes them as CSV to path if given.
+    """
+    dataset = SharedDataset(samples)
+    results = {}
+    states = {}
+    try:
+        with ProcessPoolExecutor(workers, initializer=attach, initargs=dataset.description()) as pool:
+            alive = configurations(grid)
+            trained = 0
+            for rung in range(rungs):
+                budget = epochs * 2 ** rung
+                runs = list(pool.map(train, [sizes] * len(alive), alive, [budget - trained] * len(alive),
+                                     [seed] * len(alive), [states.get(id(config)) for config in alive]))
+                trained = budget
+                costs = [cost_val for cost_val, _ in runs]
+                for config, (cost_val, state) in zip(alive, runs):
+                    results[id(config)] = dict(config, rung=rung, epochs=budget, cost=cost_val)
+                    states[id(config)] = state
+                ranked = sorted(zip(costs, range(len(alive))), key=lambda pair: (pair[0] != pair[0], pair[0]))
+                alive = [alive[number] for _, number in ranked[:max(1, round(len(alive) * keep))]]
+    finally:
+        dataset.close()
+    rows = sorted(results.values(), key=lambda row: (-row['rung'], row['cost'] != row['cost'], row['cost']))
+    if path:
+        with open(path, 'w', newline='') as table:
+            writer = csv.DictWriter(table, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    return rows
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Sweep Connection hyperparameters on XOR and write a results table")
+    parser.add_argument('--output', default='sweep_results.csv')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--rungs', type=int, default=3)
+    options = parser.parse_args()
+    xor = [([0, 0], [0]), ([0, 1], [1]), ([1, 0], [1]), ([1, 1], [0])]
+    rows = run_sweep(xor, (2, 4, 1), epochs=options.epochs, rungs=options.rungs, workers=options.workers, path=options.output)
+    for row in rows[:5]:
+        print(row)
@@ -0,0 +1,86 @@
+import json
+from math import sqrt
+from queue import Queue
+from threading import Thread
+from time import perf_counter, time
+from units import Connection
+
+class Telemetry:
+    """
+    Low-overhead training metrics, appended to a JSON-lines file.
+
+    Call record() once per commit, straight after committing. Only every `every`-th call does any
+    work: it sweeps the groups' connections once for the cost, the gradient norm (from
+    previous_delta, which holds what delta_accumulator had when it was committed), a histogram
+    of weight magnitudes, the fraction of weights sitting at Connection.max_magnitude, plasticity
+    statistics and the sample throughput since the last record. Encoding and writing happen on a
+    background thread, so the training loop never waits on the file. Call close() when done.
+    """
+    def __init__(self, path, groups, every=100, bins=10):
+        self.path = path
+        self.groups = groups
+        self.every = every
+        self.bins = bins
+        self.commits = 0
+        self.samples = 0
+        self.last_time = perf_counter()
+        self.last_samples = 0
+        self.queue = Queue()
+        self.writer = Thread(target=self._write, daemon=True)
+        self.writer.start()
+
+    def connections(self):
+        return [weight for group in self.groups for unit in group.units for weight in unit.weights]
+
+    """Count one commit covering `samples` training samples, and sample metrics if it is due"""
+    def record(self, cost=None, samples=1):
+        self.commits += 1
+        self.samples += samples
+        if self.commits % self.every:
+            return
+        self.queue.put(self.measure(cost))
+
+    def measure(self, cost=None):
+        limit = Connection.max_magnitude
+        histogram = [0] * self.bins
+        squares = 0
+        clipped = 0
+        plasticities = []
+        weights = self.connections()
+        for weight in weights:
+            magnitude = abs(weight.value)
+            histogram[min(self.bins - 1, int(magnitude / limit * self.bins))] += 1
+            if magnitude >= limit:
+                clipped += 1
+            squares += weight.previous_delta * weight.previous_delta
+            plasticities.append(weight.plasticity)
+        now = perf_counter()
+        metrics = {
+            'time': time(),
+            'commit': self.commits,
+            'samples': self.samples,
+            'cost': cost,
+            'gradient_norm': sqrt(squares),
+            'weight_histogram': histogram,
+            'clipped_fraction': clipped / len(weights) if weights else 0,
+            'plasticity': {'mean': sum(plasticities) / len(plasticities), 'min': min(plasticities),
+                           'max': max(plasticities)} if plasticities else None,
+            'samples_per_second': (self.samples - self.last_samples) / (now - self.last_time),
+            }
+        self.last_time = now
+        self.last_samples = self.samples
+        return metrics
+
+    def _write(self):
+        with open(self.path, 'a') as log:
+            while True:
+                metrics = self.queue.get()
+                if metrics is None:
+                    break
+                log.write(json.dumps(metrics) + "\n")
+                if self.queue.empty():
+                    log.flush()
+
+    def close(self):
+        self.queue.put(None)
+        self.writer.join()
@@ -0,0 +1,107 @@
+import random
+import unittest
+from units import Group, InputGroup, OutputGroup, connect
+from sparse import SparseNetwork
+from schedule import LevelScheduler
+from codegen import CompiledNetwork
+from checkpoint import CheckpointedUnroll
+
+#every engine claims to match the Group objects; these check it on a graph with every kind of edge
+steps = 7
+inputs = [[step * 0.3, 1 - step, 0.5] for step in range(steps)]
+targets = [[0.2, 0.9]] * steps
+
+def build():
+    """Skip edges, back edges into an earlier group, edges within a group and a self loop"""
+    random.seed(7)
+    first = InputGroup(3, [])
+    hidden = Group(4, recurrent_interconnected=True)
+    last = OutputGroup(2)
+    connect(first, hidden)
+    connect(hidden, last)
+    connect(last, hidden)
+    connect(last, last)
+    connect(first, last, 'sparse', density=0.5)
+    hidden.units[0].add_output(hidden.units[0])
+    return [first, hidden, last]
+
+def connections(groups):
+    return [weight for group in groups for unit in group.units for weight in unit.weights]
+
+def unroll(groups, commit=False):
+    """The object path: returns the last group's outputs per step and the summed cost"""
+    outputs = []
+    for values in inputs:
+        groups[0].update(values)
+        for group in groups:
+            group.go()
+        outputs.append([unit.output for unit in groups[-1].units])
+    cost_val = 0
+    for step in reversed(range(steps)):
+        cost_val += groups[-1].cost(targets[step], commit)
+        for group in reversed(groups[:-1]):
+            group.backprop(commit)
+    return outputs, cost_val
+
+class EngineTest(unittest.TestCase):
+    def setUp(self):
+        groups = build()
+        self.outputs, self.cost = unroll(groups)
+        self.gradients = [weight.delta_accumulator for weight in connections(groups)]
+
+    def run_engine(self, network, groups):
+        outputs = [network.go(values) for values in inputs]
+        cost_val = sum(network.backprop(targets[step], False) for step in reversed(range(steps)))
+        edge = {id(weight): number for number, weight in enumerate(network.connections)}
+        gradients = [network.gradients[edge[id(weight)]] for weight in connections(groups)]
+        return outputs, cost_val, gradients
+
+    def assertClose(self, first, second, places=12):
+        for a, b in zip(first, second):
+            self.assertAlmostEqual(a, b, places)
+
+    def check(self, make):
+        groups = build()
+        network = make(groups)
+        try:
+            outputs, cost_val, gradients = self.run_engine(network, groups)
+        finally:
+            if hasattr(network, 'close'):
+                network.close()
+        for step in range(steps):
+            self.assertClose(outputs[step], self.outputs[step])
+        self.assertAlmostEqual(cost_val, self.cost, 12)
+        self.assertClose(gradients, self.gradients)
+        return outputs, cost_val, gradients
+
+    def test_sparse(self):
+        self.check(SparseNetwork)
+
+    def test_level_scheduler(self):
+        self.check(LevelScheduler)
+
+    def test_level_scheduler_workers(self):
+        self.check(lambda groups: LevelScheduler(groups, workers=2, chunksize=1))
+
+    def test_compiled_is_identical(self):
+        outputs, cost_val, gradients = self.check(CompiledNetwork)
+        self.assertEqual(outputs, self.outputs)
+        self.assertEqual(cost_val, self.cost)
+        self.assertEqual(gradients, self.gradients)
+
+class CheckpointTest(unittest.TestCase):
+    def test_matches_full_unroll(self):
+        groups = build()
+        _, cost_val = unroll(groups)
+        for weight in connections(groups):
+            weight.commit()
+        checkpointed = build()
+        unrolled = CheckpointedUnroll(checkpointed, every=3)
+        for values in inputs:
+            unrolled.go(values)
+        self.assertEqual(unrolled.backprop(targets), cost_val)
+        self.assertEqual([weight.value for weight in connections(checkpointed)],
+                         [weight.value for weight in connections(groups)])
+
+if __name__ == "__main__":
+    unittest.main()
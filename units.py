@@ -1,5 +1,11 @@
-from random import gauss
+import gc
+from array import array
+from random import gauss, sample
+from random import random as uniform
 from nonlinearities import possible_nonlinearities as nonlins
+from initializers import possible_initializers as inits
+from losses import possible_losses as losses
+from dropout import DropoutMask
 
 def clip(value, minval, maxval):
     return min(maxval, max(minval, value))
@@ -8,8 +14,16 @@ def sign(value):
 def randn():
     return gauss(0, 1)
 
+#array typecodes for reduced-precision storage; None keeps boxed python floats
+precisions = {None: None, 'float64': 'd', 'float32': 'f'}
+def new_history(precision=None):
+    typecode = precisions[precision]
+    return [] if typecode is None else array(typecode)
+
 class Connection:
     max_magnitude = 10
+    #callables run as observer(connection, old value, new value) whenever any weight changes
+    observers = []
     def __init__(self, value=randn, plasticity=0.01, momentum=0.6, decay=0):
         if hasattr(value, '__call__'):
             self.value = value()
@@ -60,27 +74,39 @@ class Connection:
         return self._value
     @value.setter
     def value(self, newvalue):
-        self._value = newvalue
+        if Connection.observers:
+            old = self.__dict__.get('_value')
+            self._value = newvalue
+            self.changed(old)
+        else:
+            self._value = newvalue
+    def changed(self, old):
+        for observer in Connection.observers:
+            observer(self, old, self.value)
 
 class Unit:
+    #bumped whenever any unit gains or loses an edge, so caches of the graph can tell they are stale
+    rewired = 0
     """
     - Unit constructor
     """
-    def __init__(self, outputs=[], nonlinearity=nonlins['sigmoid'][0], nonlinearity_deriv=nonlins['sigmoid'][1], dropout=0, recurrent=False):
+    def __init__(self, outputs=[], nonlinearity=nonlins['sigmoid'][0], nonlinearity_deriv=nonlins['sigmoid'][1], dropout=0, recurrent=False, precision=None):
+        self.precision = precision
         self.incoming_units = []
         self.incoming_weights = []
         self.outputs = []
         self.weights = []
         for output in outputs:
-            self.add_output(outputs)
+            self.add_output(output)
         self.dropout = dropout
+        self.training = True
         self.nonlinearity = nonlinearity
         self.nonlinearity_deriv = nonlinearity_deriv
         self.frozen = False
         self.logit = 0
         self.frozenlogit = 0
-        self.hidden_state = []
-        self.derivative = []
+        self.hidden_state = new_history(precision)
+        self.derivative = new_history(precision)
         self._derivative = 0
         self.delta = 0
         self.output = 0
@@ -104,17 +130,26 @@ class Unit:
         else:
             self.logit += data
     
-    """Push own input state through """
-    def forward(self):
+    """Push own input state through.
+    While training with dropout, keep says whether this unit survives the step (drawn here if not
+    given); a dropped unit outputs 0 and kept ones are scaled up to match. The same factor goes
+    into the stored derivative, so backprop reuses the decision without remembering it."""
+    def forward(self, keep=None):
         self.output = self.nonlinearity(self.logit)
-        self.hidden_state.append(self.output)
         self._derivative = self.nonlinearity_deriv(self.output)
+        if self.dropout and self.training:
+            if keep is None:
+                keep = uniform() >= self.dropout
+            scale = 1 / (1 - self.dropout) if keep else 0
+            self.output *= scale
+            self._derivative *= scale
+        self.hidden_state.append(self.output)
         self.derivative.append(self._derivative)
         self.logit = 0
     
     """This is what people should call."""
-    def go(self):
-        self.forward()
+    def go(self, keep=None):
+        self.forward(keep)
         self.send()
     
     """If you want to make recurrent stuff, it might be a good idea to use this.
@@ -129,13 +164,13 @@ class Unit:
     def reset(self):
         self.logit = 0
         self.frozenlogit = 0
-        self.hidden_state = []
+        self.hidden_state = new_history(self.precision)
         self.frozen = False
         self.outdelta = 0
         self.delta = 0
         self.output = 0
         self._derivative = 0
-        self.derivative = []
+        self.derivative = new_history(self.precision)
     
     def backprop(self, commit = True):
         delta = 0
@@ -149,6 +184,7 @@ class Unit:
         else: self._derivative = 0
     
     def add_output(self, output, weight=None):
+        Unit.rewired += 1
         self.outputs.append(output)
         new_weight = Connection()
         self.weights.append(new_weight)
@@ -171,6 +207,7 @@ class Unit:
     #   then destroys itself
     def remove_outgoing_weight(self, weight):
         if weight in self.weights:
+            Unit.rewired += 1
             index = self.weights.index(weight)
             index2 = self.outputs[index].incoming_weights.index(weight)
             del self.outputs[index].incoming_units[index2]#remove this unit from its output unit
@@ -184,7 +221,7 @@ class Unit:
             self.weights[index].delete()
 
 class Group:
-    def __init__(self, size, recurrent_interconnected=False, *args, **kwargs):
+    def __init__(self, size, outputs=[], recurrent_interconnected=False, *args, **kwargs):
         self.units = []
         for unitID in range(size):
             self.units.append(Unit(outputs, *args, **kwargs))
@@ -202,17 +239,54 @@ class Group:
     
     def go(self):
         self.freeze()
-        for unit in self.units:
-            unit.go()
+        mask = self.dropout_mask()
+        if mask is None:
+            for unit in self.units:
+                unit.go()
+        else:
+            mask.advance()
+            for position, unit in enumerate(self.units):
+                unit.go(mask.keep(position))
         self.thaw()
     
+    def dropout_mask(self):
+        """The group's batch of dropout decisions, redrawn whenever the rates change; None if nothing drops out"""
+        rates = tuple(unit.dropout if unit.training else 0 for unit in self.units)
+        if not any(rates):
+            return None
+        mask = self.__dict__.get('mask')
+        if mask is None or mask.rates != rates:
+            mask = self.mask = DropoutMask(rates)
+        return mask
+    
+    """Switch dropout on (training) or off (evaluation) for every unit"""
+    def train(self, mode=True):
+        for unit in self.units:
+            unit.training = mode
+    def eval(self):
+        self.train(False)
+    
     def reset(self):
         for unit in self.units:
             unit.reset()
     
-    def backprop(self):
-        for unit in self.units:
-            unit.backprop()
+    def backprop(self, commit = True):
+        self.backprop_units(lambda unit: unit.backprop(commit))
+    
+    def backprop_units(self, step, *arguments):
+        """Call step(unit, *per-unit arguments) for every unit and return the results.
+        Edges within a group carry over to the next time step, so every unit has to read the
+        deltas its group had from that step; each unit's new delta is held back until all are done."""
+        later = [unit.delta for unit in self.units]
+        results = []
+        deltas = []
+        for unit, delta, *values in zip(self.units, later, *arguments):
+            results.append(step(unit, *values))
+            deltas.append(unit.delta)
+            unit.delta = delta
+        for unit, delta in zip(self.units, deltas):
+            unit.delta = delta
+        return results
 
     def __str__(self):
         result = ""
@@ -222,6 +296,79 @@ class Group:
                 result += str(weight) + "\n"
         return result
 
+#connectivity patterns for connect() - (source size, target size, options) -> for each source unit, the target indexes it feeds
+def full_pattern(n_source, n_target, **options):
+    targets = list(range(n_target))
+    return [targets] * n_source
+
+def sparse_pattern(n_source, n_target, density=0.1, **options):
+    picked = sample(range(n_source * n_target), round(density * n_source * n_target))
+    picked.sort()
+    rows = [[] for _ in range(n_source)]
+    for edge in picked:
+        rows[edge // n_target].append(edge % n_target)
+    return rows
+
+def banded_pattern(n_source, n_target, bandwidth=1, **options):
+    #each source unit connects to the target units around its own relative position, first to first and last to last
+    scale = (n_target - 1) / max(1, n_source - 1)
+    rows = []
+    for i in range(n_source):
+        centre = round(i * scale)
+        rows.append(list(range(max(0, centre - bandwidth), min(n_target, centre + bandwidth + 1))))
+    return rows
+
+possible_patterns = {
+    'full': full_pattern,
+    'sparse': sparse_pattern,
+    'banded': banded_pattern
+    }
+
+def connect(source, target, pattern='full', init='xavier', density=0.1, bandwidth=1, **connection_args):
+    """Wire every edge of a connectivity pattern from source to target in one go.
+    source and target may be Groups or plain lists of units; pattern and init may be
+    names from possible_patterns/possible_initializers or functions with the same shape.
+    Returns the new Connections, grouped by source unit."""
+    sources = getattr(source, 'units', source)
+    targets = getattr(target, 'units', target)
+    if not hasattr(pattern, '__call__'):
+        pattern = possible_patterns[pattern]
+    if not hasattr(init, '__call__'):
+        init = inits[init]
+    rows = pattern(len(sources), len(targets), density=density, bandwidth=bandwidth)
+    count = sum(len(row) for row in rows)
+    if not count:
+        return []
+    values = init(count / len(targets), count / len(sources), count)
+    #the cyclic garbage collector would otherwise rescan the growing graph many times over
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        connections = [Connection(value, **connection_args) for value in values]
+    finally:
+        if collecting:
+            gc.enable()
+    Unit.rewired += 1
+    #every source's lists are extended once; incoming lists are gathered per target first
+    incoming_units = [[] for _ in targets]
+    incoming_weights = [[] for _ in targets]
+    start = 0
+    for unit, row in zip(sources, rows):
+        if not row:
+            continue
+        weights = connections[start:start + len(row)]
+        start += len(row)
+        unit.outputs.extend([targets[j] for j in row])
+        unit.weights.extend(weights)
+        for j, weight in zip(row, weights):
+            incoming_units[j].append(unit)
+            incoming_weights[j].append(weight)
+    for unit, units, weights in zip(targets, incoming_units, incoming_weights):
+        if units:
+            unit.incoming_units.extend(units)
+            unit.incoming_weights.extend(weights)
+    return connections
+
 class InputUnit(Unit):
     def __init__(self, outputs=[], *args, **kwargs):
         super().__init__(outputs, nonlins['linear'][0], nonlins['linear'][1], *args, **kwargs)
@@ -229,10 +376,10 @@ class InputUnit(Unit):
         self.logit = value
 
 class InputGroup(Group):
-    def __init__(self, size, outputs, dropout=0):
+    def __init__(self, size, outputs, dropout=0, precision=None):
         self.units = []
         for unitID in range(size):
-            self.units.append(InputUnit(outputs, dropout))
+            self.units.append(InputUnit(outputs, dropout, precision=precision))
     def update(self, values):
         for unit, value in zip(self.units, values):
             unit.update(value)
@@ -242,14 +389,14 @@ class OutputUnit(Unit):
         super().__init__([], *args, **kwargs)
         self.cost_function = cost_function
         self.cost_derivative = cost_derivative
-    def cost(self, target):
+    def cost(self, target, commit = True):
         output = self.hidden_state.pop()
         internal_deriv = self.derivative.pop()
         if self.outputs:
             #re-add internal hidden state and derivative because backprop re-removes them
             self.hidden_state.append(output)
             self.derivative.append(internal_deriv)
-            super().backprop()
+            super().backprop(commit)
         cost_val = self.cost_function(output, target)
         dcost = self.cost_derivative(output, target)
         self.outdelta = dcost
@@ -263,11 +410,33 @@ class OutputGroup(Group):
         self.units = []
         for unitID in range(size):
             self.units.append(OutputUnit(*args, **kwargs))
-    def cost(self, targets):
-        cost_val = 0
-        for unit, target in zip(self.units, targets):
-            cost_val += unit.cost(target)
+    def cost(self, targets, commit = True):
+        cost_val = sum(self.backprop_units(lambda unit, target: unit.cost(target, commit), targets))
         return (cost_val / len(self.units))
+    def loss(self, targets, loss='mse', commit = True):
+        """Like cost(), but with one loss over the whole group - a name from possible_losses or a
+        function of the same shape - so coupled losses such as softmax cross-entropy work.
+        Like cost() this backprops a single time step, so targets is one row and the loss is
+        handed a batch of one; whole batches go straight to the functions in losses.py."""
+        if not hasattr(loss, '__call__'):
+            loss = losses[loss]
+        def pop(unit):
+            output = unit.hidden_state.pop()
+            internal_deriv = unit.derivative.pop()
+            if unit.outputs:
+                #re-add internal hidden state and derivative because backprop re-removes them
+                unit.hidden_state.append(output)
+                unit.derivative.append(internal_deriv)
+                Unit.backprop(unit, commit)
+            return output, internal_deriv
+        outputs, derivatives = zip(*self.backprop_units(pop))
+        loss_val, (gradients,) = loss([list(outputs)], [targets])
+        for unit, internal_deriv, dcost in zip(self.units, derivatives, gradients):
+            unit.outdelta = dcost
+            unit.delta = dcost * internal_deriv
+            if unit.derivative: unit._derivative = unit.derivative[-1]
+            else: unit._derivative = 0
+        return loss_val
 
 if __name__ == "__main__":
     from sys import argv as runtime_args